@@ -1,11 +1,24 @@
-import json
+import bisect
+import gzip
+import hashlib
+import logging
+import sys
+from array import array
+from collections import defaultdict
+from collections.abc import Iterable, Iterator, Sequence
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from itertools import islice
 from pathlib import Path
+from typing import NamedTuple
 from urllib.parse import urlencode
 
-from fastapi import FastAPI, Request, Form
-from fastapi.responses import HTMLResponse, RedirectResponse
+import orjson
+from fastapi import Depends, FastAPI, Request, Form
+from fastapi.responses import HTMLResponse, RedirectResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
+from jinja2 import FileSystemBytecodeCache
 
 # ==============================
 # Папки и файлы проекта
@@ -17,26 +30,68 @@ FILMS_FILE = DATA_DIR / "films.json"
 STATS_FILE = DATA_DIR / "statistics.json"
 
 # ==============================
-# Константы
+# Логирование
 # ==============================
-PER_PAGE = 10  # количество фильмов на странице
+logger = logging.getLogger(__name__)
 
 # ==============================
-# Учебная переменная для хранения отфильтрованных фильмов
-# Используется для однопользовательского режима
+# Константы
 # ==============================
-filtered_films: list[dict] = []
+PER_PAGE = 10  # количество фильмов на странице
+GZIP_LEVEL = 6  # степень сжатия готовых страниц
+PAGE_CACHE_CONTROL = "public, max-age=300"  # кэш готовых страниц в браузере на 5 минут
+STATIC_CACHE_CONTROL = "public, max-age=31536000, immutable"  # кэш статики в браузере на год
+TRIGRAM_SIZE = 3  # длина n-граммы в индексе поиска по названию
+TITLES_SEPARATOR = "\n"  # разделитель названий в общей строке для поиска
 
 # ==============================
 # FastAPI app
 # ==============================
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Прогревает кэш данных и готовых страниц при старте приложения,
+    чтобы первый запрос не тратил время на чтение JSON и рендеринг шаблонов.
+    """
+    load_catalog()
+    load_stats()
+    get_home_page()
+    get_genres_page()
+    get_statistics_page()
+    yield
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+class CachedStaticFiles(StaticFiles):
+    """
+    StaticFiles с долгим кэшированием файлов в браузере.
+    В шаблонах ссылки на статику содержат версию (?v=...),
+    поэтому при обновлении файлов достаточно поменять версию в ссылке.
+    """
+
+    def file_response(self, *args, **kwargs) -> Response:
+        response = super().file_response(*args, **kwargs)
+        response.headers["Cache-Control"] = STATIC_CACHE_CONTROL
+        return response
+
 
 # Подключаем static файлы
-app.mount("/static", StaticFiles(directory="static"), name="static")
+app.mount("/static", CachedStaticFiles(directory="static"), name="static")
 
 # Jinja2 шаблоны
 templates = Jinja2Templates(directory="templates")
+# Скомпилированные шаблоны сохраняются во временном каталоге и переживают перезапуск
+# процесса, а изменения файлов шаблонов не проверяются при каждом рендеринге
+templates.env.bytecode_cache = FileSystemBytecodeCache()
+templates.env.auto_reload = False
+
+# Шаблоны страниц с таблицами фильмов рендерятся на каждый запрос,
+# поэтому загружаются из окружения Jinja2 один раз
+GENRE_TEMPLATE = templates.get_template("genre.html")
+KEYWORD_TEMPLATE = templates.get_template("keyword.html")
+YEAR_TEMPLATE = templates.get_template("year.html")
 
 
 # ==============================
@@ -49,31 +104,366 @@ def load_json(path: Path) -> list[dict]:
     :param path: Путь к файлу JSON
     :return: Список словарей
     """
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+    return orjson.loads(path.read_bytes())
+
+
+class FilmColumns(NamedTuple):
+    """
+    Фильмы, разложенные по столбцам.
+    i-й элемент каждого столбца относится к i-му фильму из films.json.
+    """
+    titles: list[str]
+    titles_lower: list[str]  # названия в нижнем регистре для поиска
+    descriptions: list[str]
+    genres: list[str]  # интернированные строки: одна копия на жанр
+    years: array  # array("i")
+
+
+@lru_cache(maxsize=None)
+def load_films() -> FilmColumns:
+    """
+    Все фильмы в виде столбцов.
+    Файл читается один раз, дальше данные отдаются из памяти.
+    Столбцы общие для всех запросов, поэтому изменять их нельзя.
+    """
+    films = load_json(FILMS_FILE)
+
+    return FilmColumns(
+        titles=[film["title"] for film in films],
+        titles_lower=[film["title"].lower() for film in films],
+        descriptions=[film["description"] for film in films],
+        genres=[sys.intern(film["genre"]) for film in films],
+        years=array("i", (film["year"] for film in films)),
+    )
+
+
+def trigrams(text: str) -> set[str]:
+    """
+    Множество всех подстрок длины TRIGRAM_SIZE.
+
+    :param text: Исходная строка
+    :return: Множество триграмм (пустое, если строка короче TRIGRAM_SIZE)
+    """
+    return {text[i:i + TRIGRAM_SIZE] for i in range(len(text) - TRIGRAM_SIZE + 1)}
+
+
+class FilmCatalog(NamedTuple):
+    """
+    Фильмы в виде столбцов и все индексы, построенные по этим столбцам.
+    Номера фильмов в индексах — это номера элементов в столбцах films.
+    """
+    films: FilmColumns
+    genre_index: dict[str, list[int]]  # жанр -> номера фильмов этого жанра
+    genres: list[str]  # отсортированный список жанров
+    year_order: array  # номера фильмов, отсортированные по году выпуска
+    years: array  # годы выпуска в порядке year_order, для бинарного поиска
+    trigram_index: dict[str, list[int]]  # триграмма -> номера фильмов по возрастанию
+    titles_text: str  # все названия в нижнем регистре через TITLES_SEPARATOR
+    title_starts: array  # позиции начала каждого названия в titles_text
+
+
+def build_catalog(films: FilmColumns) -> FilmCatalog:
+    """
+    Строит все индексы по столбцам фильмов.
+
+    :param films: Фильмы в виде столбцов
+    :return: Каталог фильмов с индексами
+    """
+    genre_index = defaultdict(list)
+    for i, genre in enumerate(films.genres):
+        genre_index[genre].append(i)
+
+    year_order = array("i", sorted(range(len(films.years)), key=films.years.__getitem__))
+
+    trigram_index = defaultdict(list)
+    for i, title_lower in enumerate(films.titles_lower):
+        for trigram in trigrams(title_lower):
+            trigram_index[trigram].append(i)
+
+    title_starts = array("i")
+    position = 0
+    for title_lower in films.titles_lower:
+        title_starts.append(position)
+        position += len(title_lower) + len(TITLES_SEPARATOR)
+
+    return FilmCatalog(
+        films=films,
+        genre_index=dict(genre_index),
+        genres=sorted(genre_index),
+        year_order=year_order,
+        years=array("i", (films.years[i] for i in year_order)),
+        trigram_index=dict(trigram_index),
+        titles_text=TITLES_SEPARATOR.join(films.titles_lower),
+        title_starts=title_starts,
+    )
+
+
+@lru_cache(maxsize=None)
+def load_catalog() -> FilmCatalog:
+    """
+    Каталог фильмов, построенный один раз за время работы процесса.
+    Каталог общий для всех запросов, поэтому изменять его нельзя.
+    """
+    return build_catalog(load_films())
+
+
+async def get_catalog() -> FilmCatalog:
+    """
+    Зависимость для эндпойнтов: каталог фильмов из кэша в памяти.
+    Объявлена как async, чтобы FastAPI не передавал её вызов в пул потоков.
+    В тестах её можно подменить через app.dependency_overrides,
+    например на build_catalog() с тестовыми столбцами.
+    """
+    return load_catalog()
+
+
+def film_at(catalog: FilmCatalog, i: int) -> dict:
+    """
+    Собирает словарь одного фильма для вывода в шаблоне.
+
+    :param catalog: Каталог фильмов
+    :param i: Номер фильма
+    :return: Словарь с полями фильма
+    """
+    films = catalog.films
+    return {
+        "title": films.titles[i],
+        "description": films.descriptions[i],
+        "genre": films.genres[i],
+        "year": films.years[i],
+    }
 
 
-def paginate(items: list[dict], page: int, per_page: int = PER_PAGE) -> dict:
+def scan_titles(catalog: FilmCatalog, kw_lower: str) -> Iterator[int]:
+    """
+    Поиск подстроки сразу во всех названиях.
+    Вместо цикла по названиям на Python строка со всеми названиями
+    просматривается методом str.find, который работает на C.
+
+    :param catalog: Каталог фильмов
+    :param kw_lower: Ключевое слово в нижнем регистре
+    :return: Ленивый итератор номеров найденных фильмов по возрастанию
+    """
+    if TITLES_SEPARATOR in kw_lower:
+        return
+
+    text, starts = catalog.titles_text, catalog.title_starts
+    position = text.find(kw_lower)
+
+    while position != -1:
+        i = bisect.bisect_right(starts, position) - 1
+        yield i
+
+        # Продолжаем поиск со следующего названия
+        if i + 1 == len(starts):
+            return
+        position = text.find(kw_lower, starts[i + 1])
+
+
+def search_titles(catalog: FilmCatalog, kw_lower: str) -> Iterator[int]:
+    """
+    Поиск фильмов, в названии которых встречается подстрока.
+
+    Кандидаты отбираются пересечением списков триграммного индекса,
+    а затем проверяются обычным поиском подстроки.
+    Запросы короче TRIGRAM_SIZE ищутся по всем названиям через scan_titles().
+
+    :param catalog: Каталог фильмов
+    :param kw_lower: Ключевое слово в нижнем регистре
+    :return: Ленивый итератор номеров найденных фильмов по возрастанию
+    """
+    kw_trigrams = trigrams(kw_lower)
+    if not kw_trigrams:
+        return scan_titles(catalog, kw_lower)
+
+    index = catalog.trigram_index
+    postings = sorted((index.get(t, []) for t in kw_trigrams), key=len)
+    candidates = sorted(set(postings[0]).intersection(*postings[1:]))
+
+    titles_lower = catalog.films.titles_lower
+    return (i for i in candidates if kw_lower in titles_lower[i])
+
+
+def search_genre(catalog: FilmCatalog, genre: str) -> list[int]:
+    """
+    Номера фильмов указанного жанра.
+
+    :param catalog: Каталог фильмов
+    :param genre: Название жанра
+    :return: Номера фильмов по возрастанию (пустой список, если жанра нет)
+    """
+    return catalog.genre_index.get(genre, [])
+
+
+def search_years(catalog: FilmCatalog, year_from: int, year_to: int) -> memoryview:
+    """
+    Номера фильмов, вышедших в диапазоне годов, отсортированные по году.
+    Диапазон находится бинарным поиском, а memoryview режет массив номеров
+    без копирования: словари фильмов собираются потом только для текущей страницы.
+
+    :param catalog: Каталог фильмов
+    :param year_from: Начало диапазона годов (включительно)
+    :param year_to: Конец диапазона годов (включительно)
+    :return: Номера найденных фильмов
+    """
+    lo = bisect.bisect_left(catalog.years, year_from)
+    hi = bisect.bisect_right(catalog.years, year_to)
+    return memoryview(catalog.year_order)[lo:hi]
+
+
+@lru_cache(maxsize=None)
+def load_stats() -> list[dict]:
+    """
+    Данные статистики, прочитанные из файла один раз.
+    """
+    return load_json(STATS_FILE)
+
+
+class Page(NamedTuple):
+    """
+    Заранее отрендеренная страница.
+    """
+    body: bytes  # HTML в кодировке UTF-8
+    gzipped: bytes  # тот же HTML, сжатый gzip
+    etag: str  # хэш HTML, по которому браузер проверяет свою копию страницы
+
+
+def render_page(template_name: str, **context) -> Page:
+    """
+    Рендерит шаблон, которому не нужен объект запроса,
+    и сразу готовит сжатую копию результата.
+
+    :param template_name: Имя файла шаблона
+    :param context: Переменные шаблона
+    :return: Готовая страница
+    """
+    body = templates.get_template(template_name).render(context).encode("utf-8")
+    return Page(
+        body=body,
+        gzipped=gzip.compress(body, compresslevel=GZIP_LEVEL),
+        etag=hashlib.blake2b(body, digest_size=8).hexdigest(),
+    )
+
+
+def accepts_gzip(accept_encoding: str) -> bool:
+    """
+    Проверяет по заголовку Accept-Encoding, принимает ли клиент сжатие gzip.
+    Учитываются q-значения: "gzip;q=0" означает отказ от gzip.
+    Если gzip не указан явно, используется значение для "*".
+
+    :param accept_encoding: Значение заголовка Accept-Encoding
+    :return: True, если можно отдать ответ, сжатый gzip
+    """
+    qualities = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding] = quality
+
+    return qualities.get("gzip", qualities.get("*", 0.0)) > 0
+
+
+def page_response(request: Request, page: Page) -> Response:
+    """
+    Ответ с готовой страницей.
+    Если клиент принимает gzip, отдаётся заранее сжатая копия.
+    Если у клиента уже есть актуальная копия (If-None-Match совпадает с ETag),
+    отдаётся пустой ответ 304 Not Modified.
+
+    :param request: Текущий запрос
+    :param page: Готовая страница
+    :return: HTTP-ответ
+    """
+    use_gzip = accepts_gzip(request.headers.get("accept-encoding", ""))
+    # У сжатой и несжатой версии должны быть разные ETag
+    etag = f'"{page.etag}-gzip"' if use_gzip else f'"{page.etag}"'
+    headers = {
+        "Vary": "Accept-Encoding",
+        "ETag": etag,
+        "Cache-Control": PAGE_CACHE_CONTROL,
+    }
+
+    if_none_match = request.headers.get("if-none-match", "")
+    client_etags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    if etag in client_etags or "*" in client_etags:
+        return Response(status_code=304, headers=headers)
+
+    if use_gzip:
+        headers["Content-Encoding"] = "gzip"
+        return Response(page.gzipped, media_type="text/html", headers=headers)
+
+    return HTMLResponse(page.body, headers=headers)
+
+
+@lru_cache(maxsize=None)
+def get_home_page() -> Page:
+    """
+    Главная страница, отрендеренная один раз.
+    """
+    return render_page("home.html", title="Home")
+
+
+@lru_cache(maxsize=None)
+def get_genres_page() -> Page:
+    """
+    Страница со списком жанров, отрендеренная один раз.
+    """
+    return render_page("genres.html", title="Genres", genres=load_catalog().genres)
+
+
+@lru_cache(maxsize=None)
+def get_statistics_page() -> Page:
+    """
+    Страница статистики, отрендеренная один раз.
+    """
+    return render_page("statistics.html", title="Statistics", stats=load_stats())
+
+
+def paginate(items: Iterable, page: int, per_page: int = PER_PAGE) -> dict:
     """
     Пагинация списка элементов.
 
-    :param items: Список элементов
+    Последовательность (список, range, memoryview) просто режется срезом.
+    Любой другой итерируемый объект (например, генератор с фильтрацией)
+    просматривается только до конца текущей страницы и ещё на один элемент,
+    чтобы узнать, есть ли следующая страница. Весь результат фильтрации
+    при этом в память не собирается.
+
+    :param items: Список или итерируемый объект с элементами
     :param page: Текущая страница
     :param per_page: Количество элементов на странице
     :return: Словарь с информацией для пагинации
     """
-    total = len(items)
+    page = max(page, 1)
     start = (page - 1) * per_page
     end = start + per_page
-    sliced = items[start:end]
 
-    # Для отладки можно раскомментировать
-    # print('total:', total, 'start:', start, 'end:', end)
+    if isinstance(items, Sequence):
+        sliced = items[start:end]
+        has_next = end < len(items)
+    else:
+        sliced = list(islice(items, start, end + 1))
+        has_next = len(sliced) > per_page
+        del sliced[per_page:]
+
+    # Отладочный вывод: включается уровнем DEBUG, при других уровнях ничего не стоит
+    logger.debug("paginate start=%d end=%d has_next=%s", start, end, has_next)
 
     return {
         "items": sliced,
         "has_prev": page > 1,
-        "has_next": end < total,
+        "has_next": has_next,
         "page": page,
         "offset": start,
     }
@@ -84,56 +474,41 @@ def paginate(items: list[dict], page: int, per_page: int = PER_PAGE) -> dict:
 # ==============================
 
 @app.get("/", response_class=HTMLResponse)
-def home(request: Request):
+async def home(request: Request):
     """
     Главная страница проекта.
     """
-    return templates.TemplateResponse(
-        "home.html",
-        {"request": request, "title": "Home"},
-    )
+    return page_response(request, get_home_page())
 
 
 @app.get("/genres", response_class=HTMLResponse)
-def genres(request: Request):
+async def genres(request: Request):
     """
     Страница со списком жанров всех фильмов.
     """
-    films = load_json(FILMS_FILE)
-    genres_list = sorted({film["genre"] for film in films})
-
-    return templates.TemplateResponse(
-        "genres.html",
-        {
-            "request": request,
-            "title": "Genres",
-            "genres": genres_list,
-        },
-    )
+    return page_response(request, get_genres_page())
 
 
 @app.get("/genres/{genre}", response_class=HTMLResponse)
-def films_by_genre(request: Request, genre: str, page: int = 1):
+async def films_by_genre(
+    request: Request,
+    genre: str,
+    page: int = 1,
+    catalog: FilmCatalog = Depends(get_catalog),
+):
     """
     Страница со списком фильмов конкретного жанра с пагинацией.
 
     :param genre: Название жанра
     :param page: Текущая страница пагинации
     """
-    films = load_json(FILMS_FILE)
+    pagination = paginate(search_genre(catalog, genre), page)
 
-    # Обновляем глобальный список для однопользовательского варианта
-    global filtered_films
-    filtered_films = [f for f in films if f["genre"] == genre]
-
-    pagination = paginate(filtered_films, page)
-
-    return templates.TemplateResponse(
-        "genre.html",
+    html = GENRE_TEMPLATE.render(
         {
             "request": request,
             "title": f"Genre: {genre}",
-            "items": pagination["items"],
+            "items": [film_at(catalog, i) for i in pagination["items"]],
             "columns": ["title", "description", "genre", "year"],
             "page": pagination["page"],
             "has_prev": pagination["has_prev"],
@@ -141,37 +516,43 @@ def films_by_genre(request: Request, genre: str, page: int = 1):
             "offset": pagination["offset"],
         },
     )
+    return HTMLResponse(html)
 
 
 @app.post("/search/keyword", response_class=HTMLResponse)
-def keyword_search(keyword: str = Form(...)):
+async def keyword_search(keyword: str = Form(...)):
     """
     POST-эндпойнт поиска фильмов по ключевому слову в названии.
-    Сохраняет результат в глобальную переменную filtered_films.
     Делает редирект на GET-эндпойнт для отображения с пагинацией (PRG-паттерн).
+    Ключевое слово передаётся в строке запроса.
     """
-    kw_lower = keyword.lower()
-    films = load_json(FILMS_FILE)
-
-    global filtered_films
-    filtered_films = [f for f in films if kw_lower in f["title"].lower()]
-
-    return RedirectResponse(url="/search/keyword", status_code=303)
+    query = urlencode({"keyword": keyword})
+    return RedirectResponse(url=f"/search/keyword?{query}", status_code=303)
 
 
 @app.get("/search/keyword", response_class=HTMLResponse)
-def keyword_form(request: Request, page: int = 1):
+async def keyword_form(
+    request: Request,
+    keyword: str | None = None,
+    page: int = 1,
+    catalog: FilmCatalog = Depends(get_catalog),
+):
     """
     GET-эндпойнт отображения результатов поиска по ключевому слову с пагинацией.
+
+    :param keyword: Ключевое слово (если не задано, результатов нет)
+    :param page: Текущая страница пагинации
     """
-    pagination = paginate(filtered_films, page)
+    found = [] if keyword is None else search_titles(catalog, keyword.lower())
 
-    return templates.TemplateResponse(
-        "keyword.html",
+    pagination = paginate(found, page)
+
+    html = KEYWORD_TEMPLATE.render(
         {
             "request": request,
             "title": "Search by keyword",
-            "items": pagination["items"],
+            "keyword": keyword,
+            "items": [film_at(catalog, i) for i in pagination["items"]],
             "columns": ["title", "description", "genre", "year"],
             "page": pagination["page"],
             "has_prev": pagination["has_prev"],
@@ -179,34 +560,48 @@ def keyword_form(request: Request, page: int = 1):
             "offset": pagination["offset"],
         },
     )
+    return HTMLResponse(html)
 
 
 @app.post("/search/year")
-def year_form_submit(year_from: int = Form(...), year_to: int = Form(...)):
+async def year_form_submit(year_from: int = Form(...), year_to: int = Form(...)):
     """
     POST-эндпойнт поиска фильмов по году выпуска.
-    Сохраняет результат в глобальную переменную filtered_films.
     Делает редирект на GET-эндпойнт для отображения с пагинацией.
+    Диапазон годов передаётся в строке запроса.
     """
-    global filtered_films
-    films = load_json(FILMS_FILE)
-    filtered_films = [f for f in films if year_from <= f["year"] <= year_to]
-
-    return RedirectResponse(url="/search/year", status_code=303)
+    query = urlencode({"year_from": year_from, "year_to": year_to})
+    return RedirectResponse(url=f"/search/year?{query}", status_code=303)
 
 
 @app.get("/search/year", response_class=HTMLResponse)
-def year_search(request: Request, page: int = 1):
+async def year_search(
+    request: Request,
+    year_from: int | None = None,
+    year_to: int | None = None,
+    page: int = 1,
+    catalog: FilmCatalog = Depends(get_catalog),
+):
     """
     GET-эндпойнт отображения результатов поиска по годам с пагинацией.
+
+    :param year_from: Начало диапазона годов (включительно)
+    :param year_to: Конец диапазона годов (включительно)
+    :param page: Текущая страница пагинации
     """
-    pagination = paginate(filtered_films, page)
+    if year_from is None or year_to is None:
+        found = []
+    else:
+        found = search_years(catalog, year_from, year_to)
 
-    return templates.TemplateResponse(
-        "year.html",
+    pagination = paginate(found, page)
+
+    html = YEAR_TEMPLATE.render(
         {
             "request": request,
-            "items": pagination["items"],
+            "year_from": year_from,
+            "year_to": year_to,
+            "items": [film_at(catalog, i) for i in pagination["items"]],
             "columns": ["title", "description", "genre", "year"],
             "page": pagination["page"],
             "has_prev": pagination["has_prev"],
@@ -214,20 +609,12 @@ def year_search(request: Request, page: int = 1):
             "offset": pagination["offset"],
         },
     )
+    return HTMLResponse(html)
 
 
 @app.get("/statistics", response_class=HTMLResponse)
-def statistics(request: Request):
+async def statistics(request: Request):
     """
     Страница статистики (прочитанные из файла statistics.json).
     """
-    stats = load_json(STATS_FILE)
-
-    return templates.TemplateResponse(
-        "statistics.html",
-        {
-            "request": request,
-            "title": "Statistics",
-            "stats": stats,
-        },
-    )
+    return page_response(request, get_statistics_page())